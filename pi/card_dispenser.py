@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
+import threading
 import time
 from gpiozero import Button, DigitalOutputDevice
 from smartcard.System import readers
 from smartcard.Exceptions import NoCardException, CardConnectionException
+from smartcard.scard import (
+    SCARD_S_SUCCESS, SCARD_SCOPE_USER, SCARD_STATE_CHANGED,
+    SCARD_STATE_PRESENT, SCARD_STATE_UNAWARE,
+    SCardCancel, SCardEstablishContext, SCardGetStatusChange,
+)
 
 # ========== GPIO ==========
 RELAY_PIN  = 17
@@ -20,33 +26,46 @@ if not rlist:
 reader = rlist[0]
 connection = reader.createConnection()
 
+# Raw PC/SC context for blocking state-change waits; SCardCancel on it
+# wakes a pending wait from the button thread
+_, hcontext = SCardEstablishContext(SCARD_SCOPE_USER)
+READER_NAME = str(reader)
+
+GET_UID = [0xFF, 0xCA, 0x00, 0x00, 0x00]
+
 # ========== TIMING ==========
 MOTOR_ON_TIME   = 0.60
 REST_TIME       = 0.50
 SUCCESS_REST    = 0.50
 SCAN_WINDOW     = 0.80
-POLL_DELAY      = 0.02
 # ==========================
 
-running = False
-last_button = False
-last_uid = None
-
-print("🃏 Simple motor + RFID loop ready")
+# Set/cleared together by the button callback: running gates the main
+# loop, stopped cuts any timed wait short the moment STOP is pressed
+running = threading.Event()
+stopped = threading.Event()
+stopped.set()
 
 # --------------------------
 
-def poll_button():
-    global running, last_button
-    pressed = button.is_pressed
-    if pressed and not last_button:
-        running = not running
-        if running:
-            print("▶ STARTED")
-        else:
-            relay.off()
-            print("⛔ STOPPED")
-    last_button = pressed
+def toggle_running():
+    if running.is_set():
+        running.clear()
+        stopped.set()
+        relay.off()
+        SCardCancel(hcontext)
+        print("⛔ STOPPED")
+    else:
+        stopped.clear()
+        running.set()
+        print("▶ STARTED")
+
+# Edge-triggered on gpiozero's own thread; nothing polls the pin
+button.when_pressed = toggle_running
+
+def wait_or_stop(seconds):
+    """Sleeps for seconds. Returns True if STOP was pressed meanwhile."""
+    return stopped.wait(seconds)
 
 def connect_card():
     try:
@@ -57,72 +76,69 @@ def connect_card():
 
 def read_uid():
     try:
-        data, sw1, sw2 = connection.transmit(
-            [0xFF, 0xCA, 0x00, 0x00, 0x00]
-        )
+        data, sw1, sw2 = connection.transmit(GET_UID)
         if sw1 == 0x90:
-            return ''.join(f"{b:02X}" for b in data)
+            return bytes(data).hex().upper()
     except (NoCardException, CardConnectionException):
         pass
     return None
 
 def scan_for_uid(ignore_uid):
-    start = time.time()
-    while time.time() - start < SCAN_WINDOW:
-        poll_button()
-        if not running:
+    """
+    Blocks in SCardGetStatusChange until the reader reports a card (or
+    a different one), instead of reconnecting on a fixed poll.
+    """
+    deadline = time.monotonic() + SCAN_WINDOW
+    state = SCARD_STATE_UNAWARE
+
+    while running.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+
+        # Times out, or is cancelled by STOP, with a non-success result
+        hresult, states = SCardGetStatusChange(
+            hcontext, int(remaining * 1000), [(READER_NAME, state)]
+        )
+        if hresult != SCARD_S_SUCCESS:
             return None
 
-        if connect_card():
+        state = states[0][1] & ~SCARD_STATE_CHANGED
+        if state & SCARD_STATE_PRESENT and connect_card():
             uid = read_uid()
             if uid and uid != ignore_uid:
                 return uid
-
-        time.sleep(POLL_DELAY)
     return None
 
 # ========== MAIN LOOP ==========
 
-while True:
-    poll_button()
-
-    if not running:
-        time.sleep(0.05)
-        continue
-
-    # ---- MOTOR ON ----
-    relay.on()
-    start = time.time()
-    while time.time() - start < MOTOR_ON_TIME:
-        poll_button()
-        if not running:
-            relay.off()
-            break
-        time.sleep(0.005)
-    relay.off()
-
-    if not running:
-        continue
-
-    # ---- REST + SCAN ----
-    uid = scan_for_uid(last_uid)
-
-    if uid:
-        print(f"✅ UID = {uid}")
-        last_uid = uid
-
-        # extra rest on success
-        rest_start = time.time()
-        while time.time() - rest_start < SUCCESS_REST:
-            poll_button()
-            if not running:
-                break
-            time.sleep(0.02)
-    else:
-        # normal rest
-        rest_start = time.time()
-        while time.time() - rest_start < REST_TIME:
-            poll_button()
-            if not running:
-                break
-            time.sleep(0.02)
+def main():
+    print("🃏 Simple motor + RFID loop ready")
+    last_uid = None
+
+    while True:
+        running.wait()
+
+        # ---- MOTOR ON ----
+        relay.on()
+        interrupted = wait_or_stop(MOTOR_ON_TIME)
+        relay.off()
+
+        if interrupted:
+            continue
+
+        # ---- REST + SCAN ----
+        uid = scan_for_uid(last_uid)
+
+        if uid:
+            print(f"✅ UID = {uid}")
+            last_uid = uid
+
+            # extra rest on success
+            wait_or_stop(SUCCESS_REST)
+        else:
+            # normal rest
+            wait_or_stop(REST_TIME)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
+import json
 import time
 import sqlite3
 import requests
 from smartcard.System import readers
-from smartcard.Exceptions import NoCardException
+from smartcard.Exceptions import NoCardException, CardConnectionException
+from smartcard.scard import (
+    INFINITE, SCARD_S_SUCCESS, SCARD_SCOPE_USER, SCARD_STATE_CHANGED,
+    SCARD_STATE_PRESENT, SCARD_STATE_UNAWARE,
+    SCardEstablishContext, SCardGetStatusChange,
+)
 
 from card_dispenser import wait_for_button_and_dispense
 
@@ -16,8 +22,10 @@ DB_PATH = os.path.join(os.path.dirname(__file__), "poker.db")
 SERVER = "https://xavierpoker.up.railway.app"
 TABLE_ID = "xavierpokertable"
 
-POLL_INTERVAL = 0.5
+RECONNECT_DELAY = 2
+EVENTS_READ_TIMEOUT = 60  # server sends a keepalive every 15 s
 DEBOUNCE_SECONDS = 0.6
+READER_RETRY_DELAY = 0.5
 
 GET_UID = [0xFF, 0xCA, 0x00, 0x00, 0x00]
 
@@ -25,12 +33,18 @@ GET_UID = [0xFF, 0xCA, 0x00, 0x00, 0x00]
 # DB
 # ======================
 
-def lookup_card(uid):
+# uid -> card; the whole 52-row table, reread each time a scan is armed
+# so mappings retrained between decks are picked up
+CARD_MAP = {}
+
+def load_card_map():
     db = sqlite3.connect(DB_PATH)
-    cur = db.execute("SELECT card FROM card_map WHERE uid=?", (uid,))
-    row = cur.fetchone()
+    CARD_MAP.clear()
+    CARD_MAP.update(db.execute("SELECT uid, card FROM card_map"))
     db.close()
-    return row[0] if row else None
+
+def lookup_card(uid):
+    return CARD_MAP.get(uid)
 
 # ======================
 # RFID SETUP
@@ -45,11 +59,16 @@ if not r:
 reader = r[0]
 print(f"✅ Using reader: {reader}")
 
+connection = reader.createConnection()
+
+# Raw PC/SC context for blocking state-change waits, as in card_dispenser
+_, hcontext = SCardEstablishContext(SCARD_SCOPE_USER)
+READER_NAME = str(reader)
+
 # ======================
 # STATE
 # ======================
 
-state = "IDLE"
 ufids = []
 last_uid = None
 last_time = 0
@@ -58,16 +77,50 @@ last_time = 0
 # SERVER COMM
 # ======================
 
-def get_command():
-    try:
-        r = requests.get(f"{SERVER}/pi/command", timeout=2)
-        return r.json().get("action")
-    except:
-        return None
+# Keep-alive pool for deck uploads; the open event stream holds its own
+# pooled connection, so uploads run on a second one
+SESSION = requests.Session()
+
+def command_stream():
+    """
+    Yields each new /pi/command action as the server pushes it over
+    /pi/events, reconnecting whenever the stream drops.
+    """
+    last_id = None
+
+    while True:
+        try:
+            with SESSION.get(
+                f"{SERVER}/pi/events",
+                stream=True,
+                timeout=(5, EVENTS_READ_TIMEOUT),
+            ) as r:
+                r.raise_for_status()
+
+                for line in r.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+
+                    command = json.loads(line[len("data:"):])
+                    # The server replays its current command on every
+                    # connect; only act on ones not seen yet
+                    if command.get("id") == last_id:
+                        continue
+                    last_id = command.get("id")
+
+                    yield command.get("action")
+
+            print("⚠️ Event stream closed, reconnecting")
+
+        except (requests.RequestException, ValueError) as e:
+            print(f"⚠️ Event stream failed ({e}), reconnecting")
+
+        # Every way out of the stream backs off before reconnecting
+        time.sleep(RECONNECT_DELAY)
 
 def send_deck():
     print("📤 Sending deck to server")
-    requests.post(
+    SESSION.post(
         f"{SERVER}/pi/deck",
         json={
             "table_id": TABLE_ID,
@@ -80,61 +133,74 @@ def send_deck():
 # RFID LOOP
 # ======================
 
+def wait_for_reader_change(state):
+    """
+    Blocks in SCardGetStatusChange until the reader state differs from
+    state, and returns the new one. Passing the last returned state
+    back in means a card that arrived while the previous UID was being
+    handled is reported at once rather than missed.
+    """
+    while True:
+        hresult, states = SCardGetStatusChange(
+            hcontext, INFINITE, [(READER_NAME, state)]
+        )
+        if hresult == SCARD_S_SUCCESS:
+            return states[0][1] & ~SCARD_STATE_CHANGED
+        time.sleep(READER_RETRY_DELAY)
+
 def scan_loop():
     global last_uid, last_time
 
-    while True:
+    state = SCARD_STATE_UNAWARE
+
+    while len(ufids) < 52:
+        state = wait_for_reader_change(state)
+        if not state & SCARD_STATE_PRESENT:
+            continue
+
         try:
-            connection = reader.createConnection()
             connection.connect()
+            try:
+                data, _, _ = connection.transmit(GET_UID)
+            finally:
+                # Release the card handle; the next card reconnects
+                connection.disconnect()
+        except (NoCardException, CardConnectionException):
+            # Card left the reader before we could read it
+            continue
 
-            data, _, _ = connection.transmit(GET_UID)
-            uid = "".join(f"{b:02X}" for b in data)
-            now = time.time()
-
-            if uid == last_uid and (now - last_time) < DEBOUNCE_SECONDS:
-                return
+        uid = bytes(data).hex().upper()
+        now = time.monotonic()
 
-            last_uid = uid
-            last_time = now
+        if uid == last_uid and (now - last_time) < DEBOUNCE_SECONDS:
+            continue
 
-            if uid in ufids:
-                return
+        last_uid = uid
+        last_time = now
 
-            card = lookup_card(uid)
-            if not card:
-                print(f"⚠️ Unknown UID {uid}")
-                return
+        if uid in ufids:
+            continue
 
-            ufids.append(uid)
-            print(f"[SCAN] {len(ufids)} → {uid} ({card})")
+        card = lookup_card(uid)
+        if not card:
+            print(f"⚠️ Unknown UID {uid}")
+            continue
 
-        except NoCardException:
-            pass
+        ufids.append(uid)
+        print(f"[SCAN] {len(ufids)} → {uid} ({card})")
 
 # ======================
 # MAIN LOOP
 # ======================
 
-while True:
-    cmd = get_command()
-
-    if cmd == "prepare_scan" and state == "IDLE":
-        print("🟡 ARMED")
-        ufids.clear()
-        state = "ARMED"
-
-    elif state == "ARMED":
-        wait_for_button_and_dispense()
-        state = "SCANNING"
-
-    elif state == "SCANNING":
-        scan_loop()
-        if len(ufids) >= 52:
-            state = "DONE"
+for cmd in command_stream():
+    if cmd != "prepare_scan":
+        continue
 
-    elif state == "DONE":
-        send_deck()
-        state = "IDLE"
+    print("🟡 ARMED")
+    load_card_map()
+    ufids.clear()
 
-    time.sleep(POLL_INTERVAL)
+    wait_for_button_and_dispense()
+    scan_loop()
+    send_deck()
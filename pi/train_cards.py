@@ -3,6 +3,12 @@ import time
 import sqlite3
 import select
 from smartcard.System import readers
+from smartcard.Exceptions import NoCardException, CardConnectionException
+from smartcard.scard import (
+    SCARD_E_TIMEOUT, SCARD_S_SUCCESS, SCARD_SCOPE_USER, SCARD_STATE_CHANGED,
+    SCARD_STATE_EMPTY, SCARD_STATE_UNAWARE,
+    SCardEstablishContext, SCardGetStatusChange,
+)
 
 # =============================
 # CONFIG
@@ -10,6 +16,11 @@ from smartcard.System import readers
 
 DB_PATH = "cards.db"
 
+GET_UID = [0xFF, 0xCA, 0x00, 0x00, 0x00]
+
+# Short enough that Ctrl-C is still handled between waits
+REMOVAL_WAIT_MS = 1000
+
 RANKS = "23456789TJQKA"
 SUITS = "cdhs"
 
@@ -23,8 +34,27 @@ CARD_ORDER = [r + s for s in SUITS for r in RANKS]
 def key_pressed():
     return select.select([sys.stdin], [], [], 0)[0]
 
+DB = None
+
 def get_db():
-    return sqlite3.connect(DB_PATH)
+    # One connection for the whole session instead of one per query
+    global DB
+    if DB is None:
+        DB = sqlite3.connect(DB_PATH)
+        # WAL + NORMAL: each per-card commit is an append without an fsync,
+        # and the file stays consistent if the Pi loses power mid-training
+        DB.execute("PRAGMA journal_mode=WAL")
+        DB.execute("PRAGMA synchronous=NORMAL")
+    return DB
+
+def close_db():
+    # Fold the WAL back into cards.db so copying that one file carries
+    # every mapping
+    global DB
+    if DB is not None:
+        DB.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        DB.close()
+        DB = None
 
 def init_db():
     db = get_db()
@@ -35,25 +65,21 @@ def init_db():
         )
     """)
     db.commit()
-    db.close()
 
 def reset_db():
     db = get_db()
     db.execute("DELETE FROM card_map")
     db.commit()
-    db.close()
 
 def delete_uid(uid):
     db = get_db()
     db.execute("DELETE FROM card_map WHERE uid=?", (uid,))
     db.commit()
-    db.close()
 
 def uid_exists(uid):
     db = get_db()
     cur = db.execute("SELECT card FROM card_map WHERE uid=?", (uid,))
     row = cur.fetchone()
-    db.close()
     return row
 
 def save_mapping(uid, card):
@@ -63,13 +89,11 @@ def save_mapping(uid, card):
         (uid, card)
     )
     db.commit()
-    db.close()
 
 def count_mapped():
     db = get_db()
     cur = db.execute("SELECT COUNT(*) FROM card_map")
     count = cur.fetchone()[0]
-    db.close()
     return count
 
 # =============================
@@ -84,8 +108,7 @@ def get_reader():
     print(f"✅ Using reader: {r[0]}")
     return r[0]
 
-def wait_for_uid(reader, last_uid=None):
-    connection = reader.createConnection()
+def wait_for_uid(connection, last_uid=None):
     print("   Tap card  |  [S] skip  |  [B] back  |  [R] reset  |  [Q] quit")
 
     while True:
@@ -103,36 +126,48 @@ def wait_for_uid(reader, last_uid=None):
 
         try:
             connection.connect()
-            data, sw1, sw2 = connection.transmit(
-                [0xFF, 0xCA, 0x00, 0x00, 0x00]
-            )
-            uid = "".join(f"{b:02X}" for b in data)
-
-            if uid == last_uid:
-                time.sleep(0.1)
-                continue
+            try:
+                data, sw1, sw2 = connection.transmit(GET_UID)
+            finally:
+                # Release the card handle so a stale one is never kept
+                # across reads, as in rfid_listener
+                connection.disconnect()
+        except NoCardException:
+            # Nothing on the reader yet
+            time.sleep(0.1)
+            continue
+        except CardConnectionException:
+            # Card lifted mid-read or a reader fault; retry shortly
+            time.sleep(0.1)
+            continue
 
-            return uid
+        uid = bytes(data).hex().upper()
 
-        except:
+        if uid == last_uid:
             time.sleep(0.1)
+            continue
 
-def wait_for_removal(reader, uid):
-    connection = reader.createConnection()
+        return uid
+
+def wait_for_removal(hcontext, reader_name):
+    # Blocks in SCardGetStatusChange until the reader reports it is
+    # empty, instead of re-sending GET_UID every 100 ms
     print("   Remove card...")
 
+    state = SCARD_STATE_UNAWARE
+
     while True:
-        try:
-            connection.connect()
-            data, sw1, sw2 = connection.transmit(
-                [0xFF, 0xCA, 0x00, 0x00, 0x00]
-            )
-            current_uid = "".join(f"{b:02X}" for b in data)
-            if current_uid != uid:
-                return
-        except:
+        hresult, states = SCardGetStatusChange(
+            hcontext, REMOVAL_WAIT_MS, [(reader_name, state)]
+        )
+        if hresult == SCARD_E_TIMEOUT:
+            continue
+        if hresult != SCARD_S_SUCCESS:
+            return
+
+        state = states[0][1] & ~SCARD_STATE_CHANGED
+        if state & SCARD_STATE_EMPTY:
             return
-        time.sleep(0.1)
 
 # =============================
 # MAIN LOOP
@@ -144,6 +179,8 @@ def main():
 
     init_db()
     reader = get_reader()
+    connection = reader.createConnection()
+    _, hcontext = SCardEstablishContext(SCARD_SCOPE_USER)
 
     history = []          # [(uid, card)]
     last_uid = None
@@ -156,7 +193,7 @@ def main():
         card = CARD_ORDER[index]
         print(f"\n[{index + 1:02d}/52] Present card: {card}")
 
-        result = wait_for_uid(reader, last_uid)
+        result = wait_for_uid(connection, last_uid)
 
         # RESET
         if result == "__RESET__":
@@ -191,7 +228,7 @@ def main():
 
         if uid_exists(uid):
             print("⚠️ UID already mapped — ignoring")
-            wait_for_removal(reader, uid)
+            wait_for_removal(hcontext, str(reader))
             last_uid = uid
             continue
 
@@ -199,7 +236,7 @@ def main():
         history.append((uid, card))
         print(f"✅ Mapped UID {uid} → {card}")
 
-        wait_for_removal(reader, uid)
+        wait_for_removal(hcontext, str(reader))
         last_uid = uid
         index += 1
 
@@ -212,4 +249,8 @@ def main():
     print("📦 Database saved to:", DB_PATH)
 
 if __name__ == "__main__":
-    main()
+    # Also runs on the sys.exit() paths and Ctrl-C
+    try:
+        main()
+    finally:
+        close_db()
@@ -1,11 +1,19 @@
+from gevent import monkey
+
+# Sockets go cooperative for the many audience pollers; threads stay
+# real so the equity worker can crunch NumPy alongside the event loop.
+monkey.patch_all(thread=False, queue=False)
+
 from flask import Flask, render_template, request, redirect, abort, jsonify
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from gevent.event import Event
 import os
 import random
-import sqlite3
-import requests
+import threading
 
 from equity import calculate_equity_multi
-from treys import Evaluator, Card
+from equity_np import CARD_INDEX, evaluate_seven
 
 app = Flask(__name__)
 
@@ -26,11 +34,23 @@ PHASE_BACK = {
 
 STREETS = ("PREFLOP", "FLOP", "TURN", "RIVER", "SHOWDOWN")
 
+BOARD_CARDS = {"PREFLOP": 0, "FLOP": 3, "TURN": 4, "RIVER": 5}
+
+# Host-only or bulky fields the audience page never reads
+PRIVATE_FIELDS = ("host_code", "etag_nonce", "deck", "equity_by_phase", "equity_dirty", "positions")
+
 # ======================================================
 # Pi Command State (single-table)
 # ======================================================
 
-PI_COMMAND = {"action": "idle"}
+PI_COMMAND = {"action": "idle", "id": os.urandom(4).hex()}
+
+# Replaced on every new command; setting the old one wakes every
+# /pi/events stream at once
+PI_COMMAND_CHANGED = Event()
+
+# Comment line sent when idle so proxies keep the stream open
+PI_EVENTS_KEEPALIVE = 15
 
 # ======================================================
 # Host code (simple security)
@@ -96,10 +116,13 @@ def start_new_game(players, button_index, info_mode, manual_button=False, host_c
     return {
         "version": 0,
         "host_code": host_code or generate_host_code(),
+        # Scopes /game_state ETags to this game without exposing host_code
+        "etag_nonce": os.urandom(4).hex(),
 
         "info_mode": info_mode,
         "players": players,
         "button_index": button_index,
+        "positions": get_positions(players, button_index),
         "phase": "WAITING",
         "manual_button": manual_button,
 
@@ -111,6 +134,7 @@ def start_new_game(players, button_index, info_mode, manual_button=False, host_c
         "board": [],
 
         "equity_by_phase": {},
+        "equity_dirty": False,
         "last_completed_phase": None,
         "display_equities": [0.0] * n,
         "display_hand_ranks": {},
@@ -127,64 +151,211 @@ def next_card():
     return card
 
 def deal_hole_cards():
-    n = len(game_state["players"])
-    hands = {p: [] for p in game_state["players"]}
+    players = game_state["players"]
+    n = len(players)
     start = (game_state["button_index"] + 1) % n
 
-    for _ in range(2):
-        for i in range(n):
-            p = game_state["players"][(start + i) % n]
-            hands[p].append(next_card())
+    # One slice for both passes round the table, left of the button first
+    ptr = game_state["deck_pointer"]
+    cards = game_state["deck"][ptr:ptr + 2 * n]
+    game_state["deck_pointer"] = ptr + 2 * n
+
+    hands = {}
+    for i, p in enumerate(players):
+        seat = (i - start) % n
+        hands[p] = [cards[seat], cards[seat + n]]
 
     game_state["hands"] = hands
     game_state["phase"] = "PREFLOP"
+    game_state["equity_dirty"] = True
+    EQUITY_JOBS.clear()
 
 def deal_flop():
-    game_state["board"] = [next_card() for _ in range(3)]
+    ptr = game_state["deck_pointer"]
+    game_state["board"] = game_state["deck"][ptr:ptr + 3]
+    game_state["deck_pointer"] = ptr + 3
     game_state["phase"] = "FLOP"
+    game_state["equity_dirty"] = True
 
 def deal_turn():
     game_state["board"].append(next_card())
     game_state["phase"] = "TURN"
+    game_state["equity_dirty"] = True
 
 def deal_river():
     game_state["board"].append(next_card())
     game_state["phase"] = "RIVER"
+    game_state["equity_dirty"] = True
 
 # ======================================================
 # Showdown (deterministic)
 # ======================================================
 
 def resolve_showdown(game):
-    evaluator = Evaluator()
-    board = [Card.new(c) for c in game["board"]]
+    players = game["players"]
+    holes = [[CARD_INDEX[c] for c in game["hands"][p]] for p in players]
+    board = [CARD_INDEX[c] for c in game["board"]]
 
-    scores = {}
-    for p in game["players"]:
-        hole = [Card.new(c) for c in game["hands"][p]]
-        scores[p] = evaluator.evaluate(hole, board)
+    # One call scores every seat against the shared board
+    ranks = evaluate_seven(holes, [board])[0]
+    winners = ranks == ranks.min()
+    count = int(winners.sum())
 
-    best = min(scores.values())
-    winners = [p for p, s in scores.items() if s == best]
-    share = 100.0 / len(winners)
+    game["display_equities"] = (winners * (100.0 / count)).tolist()
+    game["tie_probability"] = 100.0 if count > 1 else 0.0
 
-    game["display_equities"] = [
-        share if p in winners else 0.0 for p in game["players"]
-    ]
-    game["tie_probability"] = 100.0 if len(winners) > 1 else 0.0
+# ======================================================
+# Equity (background worker)
+# ======================================================
+
+# One worker keeps Monte Carlo off the request threads; results land in
+# equity_by_phase and bump the version so pollers pick them up.
+EQUITY_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+EQUITY_JOBS = {}
+# Reentrant: a job that is already done runs its callback inside submit
+EQUITY_LOCK = threading.RLock()
+
+def request_equity():
+    # Check-and-submit under one lock so concurrent requests never
+    # queue the same street twice
+    with EQUITY_LOCK:
+        # Only dealing can change what needs computing
+        if not game_state["equity_dirty"]:
+            return
+        game_state["equity_dirty"] = False
+
+        # DELAYED mode only ever shows the previous street, so the current
+        # one is left alone until the hand moves past it
+        phase = display_phase()
+        if phase is None:
+            return
+
+        if phase in game_state["equity_by_phase"] or phase in EQUITY_JOBS:
+            return
+
+        job = EQUITY_EXECUTOR.submit(
+            compute_equity,
+            phase,
+            game_state["players"],
+            game_state["hands"],
+            game_state["board"][:BOARD_CARDS[phase]],
+        )
+        EQUITY_JOBS[phase] = job
+        job.add_done_callback(partial(forget_failed_job, phase))
+
+def forget_failed_job(phase, job):
+    error = job.exception()
+    if error is None:
+        return
+
+    app.logger.error("Equity for %s failed", phase, exc_info=error)
+
+    # Drop the dead job so the next request submits this street again
+    with EQUITY_LOCK:
+        if EQUITY_JOBS.get(phase) is job:
+            del EQUITY_JOBS[phase]
+            game_state["equity_dirty"] = True
+
+def compute_equity(phase, players, hands, board):
+
+    def show_running(equities, tie_probability):
+        # Stream the running estimate while this street is on screen
+        if game_state["hands"] is not hands or display_phase() != phase:
+            return
+        game_state["display_equities"] = equities
+        game_state["tie_probability"] = tie_probability
+        bump_version()
+
+    equities, tie_probability, hand_ranks = calculate_equity_multi(
+        [hands[p] for p in players],
+        players,
+        iterations_for(len(players), phase),
+        board,
+        progress=show_running,
+    )
+
+    # A new hand was dealt while we were running
+    if game_state is None or game_state["hands"] is not hands:
+        return
+
+    # Swap in a new dict so concurrent serializers never see it mid-update
+    game_state["equity_by_phase"] = {
+        **game_state["equity_by_phase"],
+        phase: {
+            "equities": equities,
+            "tie_probability": tie_probability,
+            "hand_ranks": hand_ranks,
+        },
+    }
+    game_state["last_completed_phase"] = phase
+
+    resolve_display_info()
+    bump_version()
+
+def display_phase():
+    """
+    Returns:
+        the street whose equity is on screen: the current one in FULL
+        mode, the one before it in DELAYED mode, None when no street
+        equity is shown
+    """
+    phase = game_state["phase"]
+    if phase in ("WAITING", "SHOWDOWN"):
+        return None
+    if game_state["info_mode"] == INFO_DELAYED:
+        return PHASE_BACK.get(phase)
+    return phase
+
+def resolve_display_info():
+    """
+    Shows display_phase()'s equity. Leaves the display untouched until
+    that equity exists.
+    """
+    info = game_state["equity_by_phase"].get(display_phase())
+    if info is None:
+        return
+
+    game_state["display_equities"] = info["equities"]
+    game_state["display_hand_ranks"] = info["hand_ranks"]
+    game_state["tie_probability"] = info["tie_probability"]
 
 # ======================================================
 # Pi API
 # ======================================================
 
+def set_pi_command(command):
+    global PI_COMMAND, PI_COMMAND_CHANGED
+    # A fresh id lets the Pi tell a new command from a replay of the
+    # last one after it reconnects
+    PI_COMMAND = {**command, "id": os.urandom(4).hex()}
+    changed, PI_COMMAND_CHANGED = PI_COMMAND_CHANGED, Event()
+    changed.set()
+
 @app.route("/pi/command", methods=["GET", "POST"])
 def pi_command():
-    global PI_COMMAND
     if request.method == "POST":
-        PI_COMMAND = request.json
+        set_pi_command(request.json)
         return {"ok": True}
     return PI_COMMAND
 
+@app.route("/pi/events")
+def pi_events():
+    """
+    Server-sent events: the current command on connect, then each new
+    one as soon as it is posted, so the Pi never polls.
+    """
+    def stream():
+        while True:
+            changed = PI_COMMAND_CHANGED
+            yield f"data: {app.json.dumps(PI_COMMAND)}\n\n"
+            while not changed.wait(PI_EVENTS_KEEPALIVE):
+                yield ": keepalive\n\n"
+
+    response = app.response_class(stream(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
 @app.route("/pi/deck", methods=["POST"])
 def receive_deck():
     global game_state
@@ -192,13 +363,16 @@ def receive_deck():
     data = request.json
     deck = data.get("deck") or data.get("ufids")
 
-    if not deck or len(deck) < 7:
+    # Enough for every hole card plus a full board; deal_flop's slice
+    # would otherwise come back short instead of failing
+    if not deck or len(deck) < 2 * len(game_state["players"]) + 5:
         abort(400, "Invalid deck")
 
     game_state["deck"] = deck
     game_state["deck_pointer"] = 0
 
     deal_hole_cards()
+    request_equity()
     bump_version()
 
     return {"ok": True}
@@ -233,11 +407,7 @@ def host_config():
         bump_version()
 
         # Tell Pi to prepare scanning
-        requests.post(
-            f"{request.host_url}pi/command",
-            json={"action": "prepare_scan"},
-            timeout=2
-        )
+        set_pi_command({"action": "prepare_scan"})
 
         return redirect(f"/host?host_code={game_state['host_code']}")
 
@@ -268,10 +438,14 @@ def host_view():
                 game_state["phase"] = "SHOWDOWN"
                 resolve_showdown(game_state)
 
+            resolve_display_info()
+            request_equity()
             bump_version()
             return redirect(f"/host?host_code={game_state['host_code']}")
 
         if request.form.get("action") == "new_round":
+            # Keep counting versions so cached /game_state tags never repeat
+            version = game_state["version"]
             game_state.update(
                 start_new_game(
                     game_state["players"],
@@ -281,18 +455,16 @@ def host_view():
                     game_state["host_code"],
                 )
             )
+            game_state["version"] = version
 
-            requests.post(
-                f"{request.host_url}pi/command",
-                json={"action": "prepare_scan"},
-                timeout=2
-            )
+            set_pi_command({"action": "prepare_scan"})
 
             bump_version()
             return redirect(f"/host?host_code={game_state['host_code']}")
 
-    positions = get_positions(game_state["players"], game_state["button_index"])
-    return render_template("host.html", game=game_state, positions=positions)
+    request_equity()
+
+    return render_template("host.html", game=game_state, positions=game_state["positions"])
 
 # ======================================================
 # Audience routes
@@ -302,22 +474,44 @@ def host_view():
 def audience_view():
     return render_template("audience.html", game=game_state)
 
+# Encoded public payload for the current tag; polls between versions
+# reuse it instead of copying and re-serializing the state
+JSON_CACHE = {}
+
 @app.route("/game_state")
 def game_state_json():
     if game_state is None:
         return {}, 200
 
-    public = dict(game_state)
-    if game_state["info_mode"] == INFO_DELAYED:
-        public["hands"] = {}
-        public["display_hand_ranks"] = {}
-
-    return public
+    # The per-game nonce keeps a restarted server or a new game from
+    # matching an old tag; host_code must never appear in a header
+    etag = f"{game_state['etag_nonce']}-{game_state['version']}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        body = JSON_CACHE.get(etag)
+        if body is None:
+            public = {k: v for k, v in game_state.items() if k not in PRIVATE_FIELDS}
+            if game_state["info_mode"] == INFO_DELAYED:
+                public["hands"] = {}
+                public["display_hand_ranks"] = {}
+
+            body = app.json.dumps(public)
+            JSON_CACHE.clear()
+            JSON_CACHE[etag] = body
+
+        response = app.response_class(body, mimetype="application/json")
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 # ======================================================
 # Run
 # ======================================================
 
 if __name__ == "__main__":
+    from gevent.pywsgi import WSGIServer
+
     port = int(os.environ.get("PORT", 8080))
-    app.run(host="0.0.0.0", port=port)
+    WSGIServer(("0.0.0.0", port), app).serve_forever()
@@ -0,0 +1,53 @@
+"""
+Precomputes heads-up preflop equity for every suit-canonical matchup
+and writes it to equity.PREFLOP_TABLE_PATH, which equity.py loads at
+import.
+
+Nothing runs this automatically: the Procfile only starts app.py, and
+without the file every preflop spot is simulated the first time it is
+dealt. Run it as the deploy's build command, before the web process
+starts:
+
+    python server/build_preflop_table.py [iterations]
+
+At the default 20000 trials it takes about half an hour on one core;
+pass fewer iterations for a quicker, noisier table. The output is
+gitignored so a local build is never committed.
+"""
+import pickle
+import sys
+from itertools import combinations
+
+from equity import PREFLOP_TABLE_PATH, canonicalize_preflop
+from equity_np import FULL_DECK, calculate_equity_multi_np
+
+DEFAULT_ITERATIONS = 20000
+
+def build_table(iterations):
+    hands = [list(h) for h in combinations(FULL_DECK, 2)]
+    table = {}
+
+    for a in hands:
+        for b in hands:
+            if set(a) & set(b):
+                continue
+
+            key = canonicalize_preflop([a, b])
+            if key in table:
+                continue
+
+            # The mirrored seat order is the same spot with equities swapped
+            equities, tie_probability = calculate_equity_multi_np(key, [], iterations)
+            table[key] = (equities, tie_probability)
+            table.setdefault(canonicalize_preflop([key[1], key[0]]), (equities[::-1], tie_probability))
+
+    return table
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ITERATIONS
+
+    table = build_table(iterations)
+    with open(PREFLOP_TABLE_PATH, "wb") as f:
+        pickle.dump(table, f)
+
+    print(f"Wrote {len(table)} matchups to {PREFLOP_TABLE_PATH}")
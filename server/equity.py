@@ -1,4 +1,19 @@
-from treys import Evaluator, Card, Deck
+import math
+import os
+import pickle
+
+from treys import Evaluator, Card
+
+from equity_np import (
+    CARD_INDEX, FULL_DECK, RANKS, SUITS,
+    calculate_equity_exact_np, calculate_equity_multi_np, evaluate_seven, runout_count,
+)
+
+# Opt-in JIT backend (needs numba installed); NumPy is the default
+if os.environ.get("EQUITY_BACKEND") == "numba":
+    from equity_numba import calculate_equity_multi_nb as simulate
+else:
+    simulate = calculate_equity_multi_np
 
 # ---------------------------------
 # Rank mapping
@@ -10,10 +25,21 @@ RANK_STR = {
     10: 'Q', 11: 'K', 12: 'A'
 }
 
+# treys ints for every card, parsed once at import
+CARD_INT = {c: Card.new(c) for c in FULL_DECK}
+
+# Stateless apart from its lookup tables, so one instance serves every call
+EVALUATOR = Evaluator()
+
 # ---------------------------------
 # Straight detection (5-card only)
 # ---------------------------------
 
+# 13-bit rank masks, highest straight first; the wheel needs the ace
+# bit in place of a rank below the deuce
+STRAIGHT_MASKS = [(0b11111 << low, low) for low in range(8, -1, -1)]
+WHEEL_MASK = 1 << 12 | 0b1111
+
 def find_five_card_straight(cards):
     """
     Returns:
@@ -21,71 +47,149 @@ def find_five_card_straight(cards):
         (low_rank_int, high_rank_int) for normal straight
         None if no straight exists
     """
-    ranks = set(Card.get_rank_int(c) for c in cards)
+    ranks = 0
+    for c in cards:
+        ranks |= 1 << Card.get_rank_int(c)
 
-    # Wheel: A-2-3-4-5
-    if {12, 0, 1, 2, 3}.issubset(ranks):
-        return ("A", "5")
+    for mask, low in STRAIGHT_MASKS:
+        if ranks & mask == mask:
+            return (low, low + 4)
 
-    # Normal straights
-    for high in range(12, 3, -1):
-        window = {high - i for i in range(5)}
-        if window.issubset(ranks):
-            return (high - 4, high)
+    # Wheel: A-2-3-4-5, only when nothing higher is made
+    if ranks & WHEEL_MASK == WHEEL_MASK:
+        return ("A", "5")
 
     return None
 
 # ---------------------------------
-# Equity calculation
+# Preflop equity table
 # ---------------------------------
 
-def calculate_equity_multi(hands_str, player_names, iterations=2000, board_str=None):
-    evaluator = Evaluator()
-    num_players = len(hands_str)
+# canonical heads-up hole cards -> (equities, tie_probability);
+# preloaded from PREFLOP_TABLE_PATH when the deploy's build step has
+# run build_preflop_table.py, otherwise filled in as hands are dealt.
+# Bounded by the ~101k heads-up matchups; multiway spots are kept in
+# MULTIWAY_PREFLOP_EQUITY instead
+PREFLOP_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "preflop_equity.pkl")
 
-    hands = [[Card.new(c) for c in h] for h in hands_str]
-    board = [Card.new(c) for c in board_str] if board_str else []
+PREFLOP_EQUITY = {}
+if os.path.exists(PREFLOP_TABLE_PATH):
+    with open(PREFLOP_TABLE_PATH, "rb") as f:
+        PREFLOP_EQUITY.update(pickle.load(f))
 
-    wins = [0.0] * num_players
-    tie_count = 0
+def canonicalize_preflop(hands_str):
+    """
+    Returns a seat-ordered key that is identical for suit-isomorphic
+    preflop spots: suits are renamed in order of first appearance, so
+    AhKh vs QsQd and AcKc vs QdQh share one table entry.
+    """
+    suit_map = {}
+    key = []
 
-    for _ in range(iterations):
-        deck = Deck()
+    for h in hands_str:
+        cards = sorted(h, key=lambda c: (RANKS.index(c[0]), c[1]), reverse=True)
+        canon = []
+        for c in cards:
+            if c[1] not in suit_map:
+                suit_map[c[1]] = SUITS[len(suit_map)]
+            canon.append(c[0] + suit_map[c[1]])
+        key.append(tuple(canon))
 
-        # Remove known cards
-        for h in hands:
-            for c in h:
-                if c in deck.cards:
-                    deck.cards.remove(c)
+    return tuple(key)
 
-        for c in board:
-            if c in deck.cards:
-                deck.cards.remove(c)
+# ---------------------------------
+# Sequential sampling
+# ---------------------------------
 
-        # Complete board
-        sim_board = board.copy()
-        while len(sim_board) < 5:
-            card = deck.draw()
-            sim_board.append(card[0] if isinstance(card, list) else card)
+BATCH_TRIALS = 128
+TARGET_STDERR = 0.5  # percentage points, worst seat
+MIN_TRIALS = 4 * BATCH_TRIALS
 
-        scores = [evaluator.evaluate(h, sim_board) for h in hands]
-        best_score = min(scores)
-        winners = [i for i, s in enumerate(scores) if s == best_score]
+def simulate_adaptive(hands, board, max_iterations, progress=None):
+    """
+    Runs trials in batches and, after at least MIN_TRIALS, stops as
+    soon as every seat's standard error is under TARGET_STDERR. Within
+    the usual 2000-trial cap that only happens for near-locked spots
+    (every seat within ~5 points of 0 or 100); anything less one-sided
+    runs to max_iterations.
+
+    progress, if given, is called with the running (equities,
+    tie_probability) after every batch but the last.
+    """
+    wins = [0.0] * len(hands)
+    ties = 0.0
+    ran = 0
+
+    while ran < max_iterations:
+        batch = min(BATCH_TRIALS, max_iterations - ran)
+        equities, tie_probability = simulate(hands, board, batch)
+
+        wins = [w + e * batch for w, e in zip(wins, equities)]
+        ties += tie_probability * batch
+        ran += batch
+
+        # Half a pseudo-win per seat keeps a 0% or 100% estimate from
+        # reading as zero error; wins are in percent-trials, so that is
+        # 50 on top of w and one extra trial
+        smoothed = ((w + 50) / (ran + 1) for w in wins)
+        stderr = max(math.sqrt(p * (100 - p) / ran) for p in smoothed)
+        if ran >= MIN_TRIALS and stderr < TARGET_STDERR:
+            break
+
+        if progress and ran < max_iterations:
+            progress([w / ran for w in wins], ties / ran)
 
-        # Split pot equity
-        share = 1.0 / len(winners)
-        for w in winners:
-            wins[w] += share
+    return [w / ran for w in wins], ties / ran
 
-        if len(winners) > 1:
-            tie_count += 1
+# ---------------------------------
+# Equity calculation
+# ---------------------------------
 
-    equities = [(w / iterations) * 100 for w in wins]
-    tie_probability = (tie_count / iterations) * 100
+# (hands, board, iterations) -> (equities, tie_probability)
+SPOT_EQUITY = {}
+SPOT_CACHE_SIZE = 4096
+
+# Canonical multiway preflop spots; unlike heads-up there are far too
+# many to hold them all, so this is capped like SPOT_EQUITY
+MULTIWAY_PREFLOP_EQUITY = {}
+
+def calculate_equity_multi(hands_str, player_names, iterations=2000, board_str=None, progress=None):
+    if board_str:
+        # Postflop spots are memoized on the actual cards: seat-ordered
+        # sorted hole cards plus the sorted board
+        key = (
+            tuple(tuple(sorted(h)) for h in hands_str),
+            tuple(sorted(board_str)),
+            iterations,
+        )
+        cache = SPOT_EQUITY
+    else:
+        # Preflop only depends on the hole cards, so look the spot up first
+        key = canonicalize_preflop(hands_str)
+        cache = PREFLOP_EQUITY if len(hands_str) == 2 else MULTIWAY_PREFLOP_EQUITY
+
+    cached = cache.get(key)
+    if cached is None:
+        if runout_count(hands_str, board_str or []) <= iterations:
+            # Few enough runouts left (always on the turn and river) that
+            # scoring each one is cheaper than sampling, and exact
+            cached = calculate_equity_exact_np(hands_str, board_str or [])
+        else:
+            cached = simulate_adaptive(hands_str, board_str or [], iterations, progress)
+        if cache is not PREFLOP_EQUITY and len(cache) >= SPOT_CACHE_SIZE:
+            cache.clear()
+        cache[key] = cached
+    equities, tie_probability = list(cached[0]), cached[1]
+
+    # One vectorized pass scores every seat on the actual board
+    scores = [None] * len(hands_str)
+    if board_str:
+        holes = [[CARD_INDEX[c] for c in h] for h in hands_str]
+        scores = evaluate_seven(holes, [[CARD_INDEX[c] for c in board_str]])[0].tolist()
 
     hand_ranks = {
-        pname: describe_hand(h, board_str or [])
-        for pname, h in zip(player_names, hands_str)
+        pname: describe_hand(h, board_str or [], score)
+        for pname, h, score in zip(player_names, hands_str, scores)
     }
 
     return equities, tie_probability, hand_ranks
@@ -94,11 +198,13 @@ def calculate_equity_multi(hands_str, player_names, iterations=2000, board_str=N
 # Hand description
 # ---------------------------------
 
-def describe_hand(hole_cards_str, board_str):
-    evaluator = Evaluator()
-
-    hole_cards = [Card.new(c) for c in hole_cards_str]
-    board_cards = [Card.new(c) for c in board_str] if board_str else []
+def describe_hand(hole_cards_str, board_str, score=None):
+    """
+    score, if the caller already has the treys score for these cards,
+    skips evaluating them again.
+    """
+    hole_cards = [CARD_INT[c] for c in hole_cards_str]
+    board_cards = [CARD_INT[c] for c in board_str] if board_str else []
     all_cards = hole_cards + board_cards
 
     # -------- Preflop --------
@@ -108,9 +214,10 @@ def describe_hand(hole_cards_str, board_str):
         ranks = sorted((Card.get_rank_int(c) for c in hole_cards), reverse=True)
         return f"High Card {RANK_STR[ranks[0]]}"
 
-    score = evaluator.evaluate(hole_cards, board_cards)
-    rank_class = evaluator.get_rank_class(score)
-    class_name = evaluator.class_to_string(rank_class)
+    if score is None:
+        score = EVALUATOR.evaluate(hole_cards, board_cards)
+    rank_class = EVALUATOR.get_rank_class(score)
+    class_name = EVALUATOR.class_to_string(rank_class)
 
     # Frequency map
     freq = {}
@@ -0,0 +1,184 @@
+from itertools import combinations, combinations_with_replacement
+from math import comb
+
+import numpy as np
+from treys import Card
+from treys.lookup import LookupTable
+
+# ---------------------------------
+# Card encoding
+# ---------------------------------
+#
+# Cards are indexed 0..51 as rank * 4 + suit, and each card also owns
+# one bit of a 52-bit mask so dead-card sets are a single OR.
+
+RANKS = "23456789TJQKA"
+SUITS = "cdhs"
+
+FULL_DECK = tuple(r + s for r in RANKS for s in SUITS)
+CARD_INDEX = {c: i for i, c in enumerate(FULL_DECK)}
+
+CARD_RANK = np.arange(52) // 4
+CARD_SUIT = np.arange(52) % 4
+CARD_MASK = [1 << i for i in range(52)]
+
+# Base-5 rank weights: a sum over up to 7 cards is a unique rank multiset key
+RANK_WEIGHT = 5 ** CARD_RANK.astype(np.int64)
+RANK_BIT = (1 << CARD_RANK).astype(np.int64)
+
+# SFC64 draws faster than the default PCG64 and needs no cryptographic quality
+RNG = np.random.Generator(np.random.SFC64())
+
+# ---------------------------------
+# 7-card lookup tables (treys-compatible scores)
+# ---------------------------------
+
+def _build_tables():
+    """
+    Returns:
+        flush_table: best score for a 13-bit rank mask of one suit
+        nonflush_keys, nonflush_scores: sorted rank-multiset keys and
+            their best non-flush score
+    """
+    lookup = LookupTable()
+    primes = np.array(Card.PRIMES, dtype=np.int64)
+
+    def best_of_fives(rank_sets, table):
+        keys = np.array(sorted(table), dtype=np.int64)
+        scores = np.array([table[k] for k in keys], dtype=np.int32)
+        best = np.full(len(rank_sets), LookupTable.MAX_HIGH_CARD + 1, dtype=np.int32)
+        for combo in combinations(range(rank_sets.shape[1]), 5):
+            products = np.prod(primes[rank_sets[:, combo]], axis=1)
+            best = np.minimum(best, scores[np.searchsorted(keys, products)])
+        return best
+
+    # Flushes: only one suit can hold 5+ of 7 cards, so its rank mask
+    # alone decides the hand (full house / quads are impossible then).
+    flush_table = np.full(1 << 13, LookupTable.MAX_HIGH_CARD + 1, dtype=np.int32)
+    for size in (5, 6, 7):
+        rank_sets = np.array(list(combinations(range(13), size)), dtype=np.int64)
+        masks = (1 << rank_sets).sum(axis=1)
+        flush_table[masks] = best_of_fives(rank_sets, lookup.flush_lookup)
+
+    # Everything else: every 5-, 6- and 7-rank multiset, best of its
+    # 5-card subsets. Counts never exceed 4, so base-5 keys of different
+    # sizes cannot collide and one sorted table serves every street.
+    keys, best = [], []
+    for size in (5, 6, 7):
+        multisets = np.array(list(_rank_multisets(size)), dtype=np.int64)
+        keys.append((5 ** multisets).sum(axis=1))
+        best.append(best_of_fives(multisets, lookup.unsuited_lookup))
+
+    keys = np.concatenate(keys)
+    best = np.concatenate(best)
+    order = np.argsort(keys)
+
+    return flush_table, keys[order], best[order]
+
+def _rank_multisets(size):
+    """Yields sorted rank tuples with at most four cards of any rank."""
+    for m in combinations_with_replacement(range(13), size):
+        if max(m.count(r) for r in set(m)) <= 4:
+            yield m
+
+FLUSH_TABLE, NONFLUSH_KEYS, NONFLUSH_SCORES = _build_tables()
+
+# ---------------------------------
+# Vectorized evaluation
+# ---------------------------------
+
+def evaluate_seven(holes, boards):
+    """
+    Scores every hole pair against every board.
+
+    holes:  (players, 2) card indices
+    boards: (trials, 3..5) card indices
+
+    Returns:
+        (trials, players) int32 treys scores (lower is better)
+    """
+    holes = np.asarray(holes)
+    boards = np.asarray(boards)
+
+    # Board partials are shared by every player; holes are added on top
+    rank_key = RANK_WEIGHT[boards].sum(axis=1)[:, None] + RANK_WEIGHT[holes].sum(axis=1)[None, :]
+    scores = NONFLUSH_SCORES[np.searchsorted(NONFLUSH_KEYS, rank_key)]
+
+    for suit in range(4):
+        board_in = CARD_SUIT[boards] == suit
+        hole_in = CARD_SUIT[holes] == suit
+
+        counts = board_in.sum(axis=1)[:, None] + hole_in.sum(axis=1)[None, :]
+        flushed = counts >= 5
+        if not flushed.any():
+            continue
+
+        bits = (
+            (RANK_BIT[boards] * board_in).sum(axis=1)[:, None]
+            | (RANK_BIT[holes] * hole_in).sum(axis=1)[None, :]
+        )
+        scores = np.where(flushed, FLUSH_TABLE[bits], scores)
+
+    return scores
+
+# ---------------------------------
+# Equity calculation
+# ---------------------------------
+
+def calculate_equity_multi_np(hands, board, iterations=2000):
+    """
+    Vectorized Monte Carlo over card strings.
+
+    Returns:
+        (equities, tie_probability), equities in seat order as percents
+    """
+    holes, known, live = _split_deck(hands, board)
+
+    needed = 5 - len(known)
+    runouts = RNG.permuted(np.broadcast_to(live, (iterations, live.size)), axis=1)[:, :needed]
+
+    return _tally(holes, _complete_boards(known, runouts))
+
+def calculate_equity_exact_np(hands, board):
+    """
+    Same result shape as calculate_equity_multi_np, but scores every
+    possible runout once instead of sampling.
+    """
+    holes, known, live = _split_deck(hands, board)
+
+    needed = 5 - len(known)
+    runouts = np.array(list(combinations(live.tolist(), needed)), dtype=live.dtype)
+
+    return _tally(holes, _complete_boards(known, runouts))
+
+def runout_count(hands, board):
+    """Returns how many distinct runouts complete the board."""
+    return comb(52 - 2 * len(hands) - len(board), 5 - len(board))
+
+def _split_deck(hands, board):
+    holes = np.array([[CARD_INDEX[c] for c in h] for h in hands])
+    known = [CARD_INDEX[c] for c in board or []]
+
+    dead = 0
+    for i in holes.ravel().tolist() + known:
+        dead |= CARD_MASK[i]
+    live = np.array([i for i in range(52) if not dead & CARD_MASK[i]])
+
+    return holes, known, live
+
+def _complete_boards(known, runouts):
+    fixed = np.broadcast_to(np.array(known, dtype=runouts.dtype), (len(runouts), len(known)))
+    return np.hstack([fixed, runouts])
+
+def _tally(holes, boards):
+    scores = evaluate_seven(holes, boards)
+    winners = scores == scores.min(axis=1, keepdims=True)
+    winner_counts = winners.sum(axis=1)
+
+    wins = (winners / winner_counts[:, None]).sum(axis=0)
+    tie_count = int((winner_counts > 1).sum())
+
+    equities = (wins / len(boards) * 100).tolist()
+    tie_probability = tie_count / len(boards) * 100
+
+    return equities, tie_probability
@@ -0,0 +1,106 @@
+import numba
+import numpy as np
+
+from equity_np import (
+    CARD_INDEX, CARD_MASK, CARD_SUIT, RANK_BIT, RANK_WEIGHT,
+    FLUSH_TABLE, NONFLUSH_KEYS, NONFLUSH_SCORES,
+)
+
+# ---------------------------------
+# JIT kernel
+# ---------------------------------
+#
+# Same card indices and lookup tables as equity_np, but each trial is a
+# compiled loop: partial Fisher-Yates over the live deck, board partials
+# shared by every seat, then one table read per hand.
+
+@numba.njit(parallel=True, cache=True)
+def _simulate(holes, known, live, iterations,
+              suit_of, rank_weight, rank_bit,
+              flush_table, nonflush_keys, nonflush_scores):
+    players = holes.shape[0]
+    needed = 5 - known.size
+
+    shares = np.zeros((iterations, players))
+    tied = np.zeros(iterations, dtype=np.bool_)
+
+    for i in numba.prange(iterations):
+        deck = live.copy()
+        board = np.empty(5, dtype=np.int64)
+        board[:known.size] = known
+
+        for k in range(needed):
+            j = k + np.random.randint(0, deck.size - k)
+            deck[k], deck[j] = deck[j], deck[k]
+            board[known.size + k] = deck[k]
+
+        board_key = 0
+        suit_counts = np.zeros(4, dtype=np.int64)
+        suit_bits = np.zeros(4, dtype=np.int64)
+        for c in board:
+            board_key += rank_weight[c]
+            suit_counts[suit_of[c]] += 1
+            suit_bits[suit_of[c]] |= rank_bit[c]
+
+        scores = np.empty(players, dtype=np.int64)
+        for p in range(players):
+            a = holes[p, 0]
+            b = holes[p, 1]
+            key = board_key + rank_weight[a] + rank_weight[b]
+            score = nonflush_scores[np.searchsorted(nonflush_keys, key)]
+
+            for s in range(4):
+                count = suit_counts[s]
+                bits = suit_bits[s]
+                if suit_of[a] == s:
+                    count += 1
+                    bits |= rank_bit[a]
+                if suit_of[b] == s:
+                    count += 1
+                    bits |= rank_bit[b]
+                if count >= 5:
+                    score = flush_table[bits]
+
+            scores[p] = score
+
+        best = scores.min()
+        winners = 0
+        for p in range(players):
+            if scores[p] == best:
+                winners += 1
+        for p in range(players):
+            if scores[p] == best:
+                shares[i, p] = 1.0 / winners
+        tied[i] = winners > 1
+
+    return shares.sum(axis=0), tied.sum()
+
+# ---------------------------------
+# Equity calculation
+# ---------------------------------
+
+def calculate_equity_multi_nb(hands, board, iterations=2000):
+    """
+    Drop-in for equity_np.calculate_equity_multi_np.
+
+    Returns:
+        (equities, tie_probability), equities in seat order as percents
+    """
+    holes = np.array([[CARD_INDEX[c] for c in h] for h in hands], dtype=np.int64)
+    known = np.array([CARD_INDEX[c] for c in board or []], dtype=np.int64)
+
+    dead = 0
+    for i in holes.ravel().tolist() + known.tolist():
+        dead |= CARD_MASK[i]
+    live = np.array([i for i in range(52) if not dead & CARD_MASK[i]], dtype=np.int64)
+
+    wins, tie_count = _simulate(
+        holes, known, live, iterations,
+        CARD_SUIT, RANK_WEIGHT, RANK_BIT,
+        FLUSH_TABLE, NONFLUSH_KEYS, NONFLUSH_SCORES,
+    )
+
+    equities = (wins / iterations * 100).tolist()
+    tie_probability = int(tie_count) / iterations * 100
+
+    return equities, tie_probability